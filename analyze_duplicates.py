@@ -1,22 +1,47 @@
 
-import csv
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from pyroaring import BitMap
+from xxhash import xxh3_64_intdigest
+
+from csv_ids import iter_id_batches, split_numeric
+
 DATA_DIR = "/Users/a1234/Downloads/project-Whick/data"
 
+def scan_file(file_path: str):
+    """Collect the IDs of a single CSV file (runs in a worker process)"""
+    if os.path.getsize(file_path) == 0:
+        return None # Empty file
+
+    file_ids = BitMap()
+    file_hashes = set()
+    file_rows = 0
+    for ids in iter_id_batches(file_path):
+        file_rows += len(ids)
+
+        # Canonical numeric IDs go into the bitmap, anything else is hashed to 64 bits
+        numbers, others = split_numeric(ids)
+        file_ids.update(numbers)
+        file_hashes.update(xxh3_64_intdigest(row_id.encode()) for row_id in others.to_pylist())
+    return file_ids, file_hashes, file_rows
+
 def analyze_duplicates():
     print(f"📊 Analyzing data in {DATA_DIR}...")
     
-    files = [f for f in os.listdir(DATA_DIR) if f.endswith('.csv')]
-    files.sort()
+    # Collect sizes while listing so the pool can start on the largest files
+    with os.scandir(DATA_DIR) as it:
+        sizes = {e.name: e.stat().st_size for e in it if e.name.endswith('.csv')}
+    files = sorted(sizes)
     
     if not files:
         print("❌ No CSV files found.")
         return
 
-    seen_ids = set()
+    seen_ids = BitMap()  # Numeric IDs fit a roaring bitmap at ~1 bit/ID
+    seen_hashes = set()  # xxh3 digests of all other IDs
     total_stats = {
         "files_processed": 0,
         "total_rows": 0,
@@ -28,55 +53,50 @@ def analyze_duplicates():
     print(f"{'File Name':<30} | {'Rows':<12} | {'New Unique':<12} | {'Duplicates':<12} | {'Dup Rate':<8}")
     print("-" * 80)
 
-    for filename in files:
-        file_path = os.path.join(DATA_DIR, filename)
-        file_rows = 0
-        file_dups = 0
-        file_new_unique = 0
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-                reader = csv.reader(f)
-                try:
-                    header = next(reader) # Skip header
-                except StopIteration:
-                    continue # Empty file
-
-                for row in reader:
-                    if not row: continue
-                    
-                    # Assume ID is first column
-                    try:
-                        row_id = row[0]
-                    except IndexError:
-                        continue
-                        
-                    file_rows += 1
-                    
-                    if row_id in seen_ids:
-                        file_dups += 1
-                    else:
-                        seen_ids.add(row_id)
-                        file_new_unique += 1
-            
-            dup_rate = (file_dups / file_rows * 100) if file_rows > 0 else 0
-            print(f"{filename:<30} | {file_rows:<12,} | {file_new_unique:<12,} | {file_dups:<12,} | {dup_rate:5.1f}%")
-            
-            total_stats["files_processed"] += 1
-            total_stats["total_rows"] += file_rows
-            total_stats["unique_rows"] += file_new_unique
-            total_stats["duplicate_rows"] += file_dups
-
-        except Exception as e:
-            print(f"Error reading {filename}: {e}")
+    # Files are independent until the merge, so scan them on all cores
+    # and merge the per-file bitmaps in file order
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        # Largest files first shortens the makespan; results are still merged by name
+        futures = {
+            f: executor.submit(scan_file, os.path.join(DATA_DIR, f))
+            for f in sorted(files, key=sizes.get, reverse=True)
+        }
+
+        for filename in files:
+            try:
+                result = futures[filename].result()
+                if result is None:
+                    continue
+                file_ids, file_hashes, file_rows = result
+
+                # Set algebra on the bitmaps runs in C
+                new_ids = file_ids - seen_ids
+                new_hashes = file_hashes - seen_hashes
+                file_new_unique = len(new_ids) + len(new_hashes)
+                seen_ids |= new_ids
+                seen_hashes |= new_hashes
+
+                file_dups = file_rows - file_new_unique
+                
+                dup_rate = (file_dups / file_rows * 100) if file_rows > 0 else 0
+                print(f"{filename:<30} | {file_rows:<12,} | {file_new_unique:<12,} | {file_dups:<12,} | {dup_rate:5.1f}%")
+                
+                total_stats["files_processed"] += 1
+                total_stats["total_rows"] += file_rows
+                total_stats["unique_rows"] += file_new_unique
+                total_stats["duplicate_rows"] += file_dups
+
+            except Exception as e:
+                print(f"Error reading {filename}: {e}")
 
     print("-" * 80)
+    total_unique = len(seen_ids) + len(seen_hashes)
     total_dup_rate = (total_stats["duplicate_rows"] / total_stats["total_rows"] * 100) if total_stats["total_rows"] > 0 else 0
-    print(f"{'TOTAL':<30} | {total_stats['total_rows']:<12,} | {len(seen_ids):<12,} | {total_stats['duplicate_rows']:<12,} | {total_dup_rate:5.1f}%")
+    print(f"{'TOTAL':<30} | {total_stats['total_rows']:<12,} | {total_unique:<12,} | {total_stats['duplicate_rows']:<12,} | {total_dup_rate:5.1f}%")
     print("-" * 80)
     print(f"\n📈 Final Summary:")
     print(f"   Total Records Processed: {total_stats['total_rows']:,}")
-    print(f"   Total Unique IDs:        {len(seen_ids):,}")
+    print(f"   Total Unique IDs:        {total_unique:,}")
     print(f"   Total Duplicates:        {total_stats['duplicate_rows']:,}")
     print(f"   Overall Redundancy:      {total_dup_rate:.1f}%")
 
@@ -3,7 +3,9 @@ Crawlee Scraper Configuration - Distributed Mode
 """
 import os
 import socket
-import hashlib
+import zlib
+from functools import lru_cache
+from pathlib import Path
 
 # Target API
 BASE_URL = "https://filovesk.click/api/item/type"
@@ -14,6 +16,7 @@ TOTAL_PRODUCTS = 119_558_423
 MAX_CONCURRENCY = 100  # Concurrent requests
 BATCH_SIZE = 100  # Requests per batch
 REQUEST_TIMEOUT = 30  # Seconds
+STATUS_INTERVAL = 5  # Seconds between background status updates / buffer saves
 
 # Deduplication & Auto-Stop
 MAX_DUPLICATE_RATIO = 0.95  # Stop when 95% of results are duplicates
@@ -24,7 +27,9 @@ TARGET_UNIQUE = 10_000_000  # Target 10M unique products (adjustable)
 OUTPUT_FILE = "data/products.csv"
 CHECKPOINT_FILE = "data/.checkpoint"
 SEEN_IDS_FILE = "data/.seen_ids"
+NODE_ID_FILE = "data/.node_id"
 SAVE_INTERVAL = 500  # Save every N unique products
+SAVE_MAX_AGE = 5  # Seconds a non-empty buffer may wait before it is saved anyway
 
 # CSV Headers
 CSV_HEADERS = [
@@ -33,26 +38,63 @@ CSV_HEADERS = [
     "image_urls", "main_image", "created_at", "updated_at", "md5", "jump"
 ]
 
+def _build_csv_row_formatter(headers):
+    """Generate a QUOTE_ALL row formatter with one inlined expression per column"""
+    fields = " + '\",\"' + ".join(
+        f"('' if row[{h!r}] is None else str(row[{h!r}])).replace('\"', '\"\"')"
+        for h in headers
+    )
+    namespace = {}
+    exec(f"def format_csv_row(row):\n    return '\"' + {fields} + '\"\\r\\n'\n", namespace)
+    return namespace["format_csv_row"]
+
+# Same output as csv.DictWriter(fieldnames=CSV_HEADERS, quoting=csv.QUOTE_ALL)
+format_csv_row = _build_csv_row_formatter(CSV_HEADERS)
+CSV_HEADER_LINE = format_csv_row(dict(zip(CSV_HEADERS, CSV_HEADERS)))
+
 # =============================================================================
 # DISTRIBUTED MODE SETTINGS
 # =============================================================================
 
+@lru_cache(maxsize=1)
 def _get_external_ip():
-    """Get external IP address (with fallback)"""
+    """Get external IP address (None if unreachable)"""
     import urllib.request
     try:
-        return urllib.request.urlopen('https://api.ipify.org', timeout=3).read().decode('utf-8')
+        return urllib.request.urlopen('https://api.ipify.org', timeout=0.5).read().decode('utf-8')
     except:
-        return socket.gethostname()[:15]
+        return None
 
 def _generate_stable_node_id():
-    """Generate stable Node ID with IP for easy identification"""
+    """Generate stable Node ID with IP for easy identification (cached in NODE_ID_FILE)"""
+    node_id_file = Path(NODE_ID_FILE)
+    try:
+        cached = node_id_file.read_text().strip()
+        if cached:
+            return cached
+    except OSError:
+        pass
+
     ip = _get_external_ip()
-    host_hash = hashlib.md5(ip.encode()).hexdigest()[:4]
-    return f"node-{ip}-{host_hash}"
+    offline = ip is None
+    if offline:
+        ip = socket.gethostname()[:15]
+
+    host_hash = f"{zlib.crc32(ip.encode()) & 0xffffffff:08x}"[:4]
+    node_id = f"node-{ip}-{host_hash}"
+    if offline:
+        return node_id  # Don't cache the fallback; retry the lookup next start
+
+    try:
+        node_id_file.parent.mkdir(parents=True, exist_ok=True)
+        node_id_file.write_text(node_id)
+    except OSError:
+        pass
+    return node_id
 
 # Node identification - includes IP for easy identification
-NODE_ID = os.environ.get("SCRAPER_NODE_ID", _generate_stable_node_id())
+# (SCRAPER_NODE_ID skips the lookup entirely)
+NODE_ID = os.environ.get("SCRAPER_NODE_ID") or _generate_stable_node_id()
 
 # Redis settings for central deduplication
 # ID Traversal Settings
@@ -60,6 +102,8 @@ ID_INFO_URL = "https://filovesk.click/api/item/info" # GET parameter: id
 ID_RANGE_START = 2_700_000
 ID_RANGE_END = 115_000_000
 CHUNK_SIZE = 10_000 # IDs per work unit in Redis
+CHUNK_CLAIM = 1 # Chunks a node claims per Redis round trip (claimed chunks are lost if the node is killed -9)
+SHUFFLE_CHUNK_IDS = os.environ.get("SHUFFLE_CHUNK_IDS", "") == "1"  # Fetch a chunk's IDs in random order
 
 # Redis settings for central deduplication
 REDIS_HOST = os.environ.get("REDIS_HOST", "149.104.78.154")  # Default to verified Redis host
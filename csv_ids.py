@@ -0,0 +1,37 @@
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pac
+
+# Stream only the id column in large blocks (parsing stays in Arrow's C++ reader).
+# Descriptions may contain quoted newlines, so keep newlines_in_values on.
+READ_OPTIONS = pac.ReadOptions(block_size=8 << 20)
+PARSE_OPTIONS = pac.ParseOptions(newlines_in_values=True, invalid_row_handler=lambda row: "skip")
+CONVERT_OPTIONS = pac.ConvertOptions(
+    include_columns=["id"],
+    column_types={"id": pa.string()},
+    check_utf8=False,
+)
+
+# Canonical decimal IDs that fit a uint32; anything else (leading zeros, non-ASCII
+# digits, larger numbers) stays a string so distinct IDs never merge
+NUMERIC_ID = r"^[1-9][0-9]{0,8}$"
+
+def iter_id_batches(source):
+    """Yield the non-null IDs of a CSV file (path or binary file object) block by block"""
+    reader = pac.open_csv(
+        source,
+        read_options=READ_OPTIONS,
+        parse_options=PARSE_OPTIONS,
+        convert_options=CONVERT_OPTIONS,
+    )
+    for batch in reader:
+        yield batch.column(0).drop_null()
+
+def split_numeric(ids):
+    """Split an ID array into canonical numeric IDs (uint32 ndarray) and the other strings"""
+    numeric = pc.match_substring_regex(ids, NUMERIC_ID)
+    return (
+        pc.cast(ids.filter(numeric), pa.uint32()).to_numpy(),
+        ids.filter(pc.invert(numeric)),
+    )
@@ -1,17 +1,87 @@
 
-import csv
+import mmap
 import sys
 import shutil
 from pathlib import Path
 
+import numpy as np
+from numba import njit
+
+FNV_OFFSET = np.uint64(0xcbf29ce484222325)
+FNV_PRIME = np.uint64(0x100000001b3)
+
+@njit(cache=True)
+def scan_records(buf):
+    """Split a CSV byte buffer into records and key each one by its first column.
+
+    Returns (starts, ends, keys). A newline only ends a record when the record
+    so far holds an even number of quotes; otherwise it sits inside a quoted
+    field. Canonical numeric IDs become their int value, other IDs (including
+    ones with a leading zero, so "0017" never merges with "17") an FNV-1a hash
+    mapped to the negative range, and records without an ID get -1.
+    """
+    n = buf.shape[0]
+    max_records = 1
+    for i in range(n):
+        if buf[i] == 10:
+            max_records += 1
+
+    starts = np.empty(max_records, np.int64)
+    ends = np.empty(max_records, np.int64)
+    keys = np.empty(max_records, np.int64)
+    count = 0
+    pos = 0
+    while pos < n:
+        start = pos
+        quotes = 0
+        while pos < n:
+            c = buf[pos]
+            pos += 1
+            if c == 34:
+                quotes += 1
+            elif c == 10 and quotes % 2 == 0:
+                break
+
+        # First column: canonical digits parse straight to int64, anything else is hashed
+        value = 0
+        h = FNV_OFFSET
+        length = 0
+        numeric = True
+        leading_zero = False
+        j = start
+        while j < pos:
+            c = buf[j]
+            j += 1
+            if c == 44 or c == 10 or c == 13:
+                break
+            if c == 34:
+                continue
+            length += 1
+            h = (h ^ np.uint64(c)) * FNV_PRIME
+            if 48 <= c <= 57 and length <= 18:
+                value = value * 10 + (c - 48)
+                if length == 1 and c == 48:
+                    leading_zero = True
+            else:
+                numeric = False
+        if leading_zero and length > 1:
+            numeric = False
+
+        starts[count] = start
+        ends[count] = pos
+        if length == 0:
+            keys[count] = -1
+        elif numeric:
+            keys[count] = value
+        else:
+            keys[count] = -np.int64(h >> np.uint64(2)) - 2
+        count += 1
+
+    return starts[:count], ends[:count], keys[:count]
+
 def deduplicate_csv(input_file: str, output_file: str):
     print(f"🧹 Deduplicating {input_file}...")
     
-    seen_ids = set()
-    duplicates = 0
-    total_rows = 0
-    written_rows = 0
-    
     input_path = Path(input_file)
     output_path = Path(output_file)
     
@@ -19,40 +89,35 @@ def deduplicate_csv(input_file: str, output_file: str):
         print(f"❌ Input file not found: {input_file}")
         return
 
-    with open(input_path, 'r', encoding='utf-8', errors='replace') as f_in, \
-         open(output_path, 'w', encoding='utf-8') as f_out:
-        
-        reader = csv.reader(f_in)
-        writer = csv.writer(f_out, quoting=csv.QUOTE_ALL)
+    if input_path.stat().st_size == 0:
+        print("⚠️ Empty file")
+        return
+
+    # The whole scan runs in the JIT-compiled loop over the mapped bytes;
+    # unique records are then copied through as raw byte ranges
+    with open(input_path, 'rb') as f_in, \
+         mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+         open(output_path, 'wb', buffering=1 << 20) as f_out:
         
-        try:
-            header = next(reader)
-            writer.writerow(header)
-        except StopIteration:
-            print("⚠️ Empty file")
-            return
-
-        for row in reader:
-            total_rows += 1
-            if not row:
-                continue
-                
-            # Assume ID is the first column
-            try:
-                row_id = row[0]
-            except IndexError:
-                continue
-                
-            if row_id in seen_ids:
-                duplicates += 1
-                continue
-            
-            seen_ids.add(row_id)
-            writer.writerow(row)
-            written_rows += 1
-            
-            if total_rows % 500000 == 0:
-                print(f"   Processed {total_rows:,} rows... (Duplicates: {duplicates:,})")
+        buf = np.frombuffer(mm, dtype=np.uint8)
+        starts, ends, keys = scan_records(buf)
+        del buf  # Release the export so the mmap can close
+
+        f_out.write(mm[starts[0]:ends[0]])  # Header
+
+        # First occurrence of every key wins, records without an ID are dropped
+        keys = keys[1:]
+        total_rows = len(keys)
+        _, first = np.unique(keys, return_index=True)
+        keep = np.sort(first[keys[first] != -1]) + 1
+        written_rows = len(keep)
+        duplicates = int(np.count_nonzero(keys != -1)) - written_rows
+
+        # Write runs of consecutive kept records as single slices
+        if written_rows:
+            breaks = np.flatnonzero(np.diff(keep) != 1)
+            for lo, hi in zip(keep[np.r_[0, breaks + 1]], keep[np.r_[breaks, written_rows - 1]]):
+                f_out.write(mm[starts[lo]:ends[hi]])
 
     print(f"✅ Deduplication complete!")
     print(f"   Original rows: {total_rows:,}")
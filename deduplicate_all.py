@@ -1,13 +1,26 @@
 
-import csv
+import mmap
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import numpy as np
+from pyroaring import BitMap
+
+from dedup_data import scan_records
+
 DATA_DIR = "/Users/a1234/Downloads/project-Whick/data"
 OUTPUT_FILE = os.path.join(DATA_DIR, "products_merged.csv")
 SEEN_IDS_FILE = "/Users/a1234/Downloads/project-Whick/shop/crawlee_scraper/data/.seen_ids"
 
+def prefetch(file_path: str):
+    """Read a file once so it sits in the OS page cache (runs in a background thread)"""
+    chunk = bytearray(1 << 20)
+    with open(file_path, 'rb', buffering=0) as f:
+        while f.readinto(chunk):
+            pass
+
 def deduplicate_all():
     print(f"🧹 Deduplicating ALL files in {DATA_DIR}...")
     
@@ -18,7 +31,8 @@ def deduplicate_all():
         print("❌ No CSV files found.")
         return
 
-    seen_ids = set()
+    seen_ids = BitMap()  # Numeric IDs fit a roaring bitmap at ~1 bit/ID
+    seen_hashes = set()  # Hashed keys of non-numeric (or > 32-bit) IDs
     total_stats = {
         "files_processed": 0,
         "total_rows": 0,
@@ -28,48 +42,79 @@ def deduplicate_all():
 
     print(f"📦 Output file: {OUTPUT_FILE}")
     
-    with open(OUTPUT_FILE, 'w', encoding='utf-8', newline='') as f_out, \
-         open(SEEN_IDS_FILE, 'w', encoding='utf-8') as f_seen:
+    with open(OUTPUT_FILE, 'wb', buffering=1 << 20) as f_out, \
+         open(SEEN_IDS_FILE, 'wb', buffering=1 << 20) as f_seen, \
+         ThreadPoolExecutor(max_workers=1) as prefetcher:
         
-        writer = csv.writer(f_out, quoting=csv.QUOTE_ALL)
         header_written = False
         
-        for filename in files:
-            file_path = os.path.join(DATA_DIR, filename)
+        # While one file is scanned, the next is read from disk in the background
+        paths = [os.path.join(DATA_DIR, f) for f in files]
+        prefetcher.submit(prefetch, paths[0])
+
+        for i, filename in enumerate(files):
+            file_path = paths[i]
+            if i + 1 < len(paths):
+                prefetcher.submit(prefetch, paths[i + 1])
             print(f"📄 Processing {filename}...", end="", flush=True)
             
             file_rows = 0
             file_dups = 0
             
             try:
-                with open(file_path, 'r', encoding='utf-8', errors='replace') as f_in:
-                    reader = csv.reader(f_in)
-                    try:
-                        header = next(reader)
-                        if not header_written:
-                            writer.writerow(header)
-                            header_written = True
-                    except StopIteration:
-                        print(" (Empty)")
-                        continue
-
-                    for row in reader:
-                        if not row: continue
-                        
-                        try:
-                            row_id = row[0]
-                        except IndexError:
-                            continue
-                            
-                        file_rows += 1
-                        
-                        if row_id in seen_ids:
-                            file_dups += 1
-                        else:
-                            seen_ids.add(row_id)
-                            writer.writerow(row)
-                            f_seen.write(f"{row_id}\n")
-                            total_stats["unique_rows"] += 1
+                if os.path.getsize(file_path) == 0:
+                    print(" (Empty)")
+                    continue
+
+                # Records are split and keyed by scan_records; unique ones are
+                # copied through as raw bytes instead of a csv parse/re-quote roundtrip
+                with open(file_path, 'rb') as f_in, \
+                     mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    buf = np.frombuffer(mm, dtype=np.uint8)
+                    starts, ends, keys = scan_records(buf)
+                    del buf  # Release the export so the mmap can close
+
+                    if not header_written:
+                        f_out.write(mm[starts[0]:ends[0]])
+                        header_written = True
+
+                    # Sort-based dedup: np.unique finds each key's first row in the
+                    # file, then one bitmap difference drops keys seen in earlier files
+                    row_keys = keys[1:]
+                    file_rows = int(np.count_nonzero(row_keys != -1))
+                    _, first = np.unique(row_keys, return_index=True)
+                    first = first[row_keys[first] != -1]
+                    candidates = row_keys[first]
+
+                    # Numeric IDs go into the bitmap, hashed keys into a plain set
+                    small = (candidates >= 0) & (candidates <= 0xFFFFFFFF)
+                    new_ids = BitMap(candidates[small].astype(np.uint32)) - seen_ids
+                    seen_ids |= new_ids
+                    is_new = np.ones(len(candidates), dtype=bool)
+                    is_new[small] = np.isin(candidates[small], np.frombuffer(new_ids.to_array(), dtype=np.uint32))
+                    other = candidates[~small].tolist()
+                    is_new[~small] = [key not in seen_hashes for key in other]
+                    seen_hashes.update(other)
+
+                    keep = np.sort(first[is_new]) + 1
+                    file_dups = file_rows - len(keep)
+                    total_stats["unique_rows"] += len(keep)
+
+                    if len(keep):
+                        # Copy runs of consecutive kept records as single slices
+                        breaks = np.flatnonzero(np.diff(keep) != 1)
+                        for lo, hi in zip(keep[np.r_[0, breaks + 1]], keep[np.r_[breaks, len(keep) - 1]]):
+                            f_out.write(mm[starts[lo]:ends[hi]])
+                        if mm[ends[keep[-1]] - 1] != ord("\n"):
+                            f_out.write(b"\r\n")  # Last line of a file without a newline
+
+                        # Record each ID exactly as it appears in the file, not its key
+                        seen_lines = [
+                            mm[starts[idx]:ends[idx]].split(b",", 1)[0].strip(b'"\r\n')
+                            for idx in keep.tolist()
+                        ]
+                        seen_lines.append(b"")
+                        f_seen.write(b"\n".join(seen_lines))
             except Exception as e:
                 print(f" Error reading file: {e}")
                 continue
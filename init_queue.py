@@ -1,6 +1,7 @@
 
 import redis
 import argparse
+from itertools import islice
 from config import (
     REDIS_HOST, REDIS_PORT, REDIS_PASSWORD, REDIS_DB,
     REDIS_QUEUE_KEY, ID_RANGE_START, ID_RANGE_END, CHUNK_SIZE
@@ -38,19 +39,23 @@ def init_queue(clear=False):
 
     print(f"🚀 Generating chunks from {ID_RANGE_START:,} to {ID_RANGE_END:,} (Size: {CHUNK_SIZE:,})")
     
-    chunks = []
-    for start in range(ID_RANGE_START, ID_RANGE_END, CHUNK_SIZE):
-        end = min(start + CHUNK_SIZE, ID_RANGE_END)
-        chunks.append(f"{start}:{end}")
+    chunks = (
+        f"{start}:{min(start + CHUNK_SIZE, ID_RANGE_END)}"
+        for start in range(ID_RANGE_START, ID_RANGE_END, CHUNK_SIZE)
+    )
+    total_chunks = len(range(ID_RANGE_START, ID_RANGE_END, CHUNK_SIZE))
     
-    print(f"📦 Generated {len(chunks):,} chunks")
+    print(f"📦 Generated {total_chunks:,} chunks")
     
-    # Push in batches
-    batch_size = 1000
-    for i in range(0, len(chunks), batch_size):
-        batch = chunks[i:i+batch_size]
-        r.rpush(REDIS_QUEUE_KEY, *batch)
-        print(f"   Saved {i+len(batch)}/{len(chunks)} chunks...")
+    # Queue every RPUSH on one pipeline so the whole push costs a single round trip
+    batch_size = 10_000
+    pipe = r.pipeline(transaction=False)
+    queued = 0
+    while batch := list(islice(chunks, batch_size)):
+        pipe.rpush(REDIS_QUEUE_KEY, *batch)
+        queued += len(batch)
+    pipe.execute()
+    print(f"   Saved {queued}/{total_chunks} chunks...")
 
     print("✅ Queue initialization complete!")
 
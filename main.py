@@ -1,17 +1,31 @@
 
 import asyncio
-import csv
-import json
 import logging
 import sys
+import threading
 import time
 import argparse
 import random
+import signal
 from pathlib import Path
 from typing import Set, List
 from collections import deque
 
 import aiohttp
+from yarl import URL
+
+# libuv event loop (optional, not available on Windows)
+try:
+    import uvloop
+    UVLOOP_AVAILABLE = True
+except ImportError:
+    UVLOOP_AVAILABLE = False
+
+# Faster JSON (optional); redis-py accepts the dumped bytes as-is
+try:
+    from orjson import dumps as json_dumps, loads as json_loads
+except ImportError:
+    from json import dumps as json_dumps, loads as json_loads
 
 # Redis support
 try:
@@ -24,10 +38,10 @@ except ImportError:
 
 from config import (
     ID_INFO_URL, LIMIT_PER_PAGE, MAX_CONCURRENCY, BATCH_SIZE,
-    REQUEST_TIMEOUT, OUTPUT_FILE, SEEN_IDS_FILE, CSV_HEADERS, SAVE_INTERVAL,
+    REQUEST_TIMEOUT, STATUS_INTERVAL, OUTPUT_FILE, SEEN_IDS_FILE, CSV_HEADER_LINE, format_csv_row, SAVE_INTERVAL,
     NODE_ID, REDIS_HOST, REDIS_PORT, REDIS_PASSWORD, REDIS_DB,
     REDIS_SEEN_IDS_KEY, REDIS_NODE_STATUS_KEY, REDIS_QUEUE_KEY,
-    CHUNK_SIZE
+    CHUNK_SIZE, CHUNK_CLAIM, SHUFFLE_CHUNK_IDS
 )
 from transform import transform_product
 
@@ -49,6 +63,8 @@ class RedisClient:
     def __init__(self):
         self.client = None
         self.connected = False
+        self.claimed = deque()  # Chunks popped from Redis but not handed out yet
+        self.multi_pop = True
         
     async def connect(self) -> bool:
         if not REDIS_AVAILABLE or not REDIS_HOST:
@@ -61,7 +77,7 @@ class RedisClient:
                 db=REDIS_DB,
                 socket_timeout=15,  # Increased timeout
                 socket_connect_timeout=15,
-                decode_responses=True
+                decode_responses=False  # Only chunk strings are read back; decoded in pop_chunk
             )
             await self.client.ping()
             self.connected = True
@@ -77,24 +93,51 @@ class RedisClient:
             await self.connect()
         # Ping occasionally? No, assume connection is good or restart loop will handle it
     
-    async def pop_chunk(self) -> str:
+    def _queue_status(self, pipe, stats: dict):
+        """Add the node status HSET + EXPIRE to a pipeline"""
+        stats['last_update'] = time.time()
+        pipe.hset(REDIS_NODE_STATUS_KEY, NODE_ID, json_dumps(stats))
+        pipe.expire(REDIS_NODE_STATUS_KEY, 300)
+
+    async def pop_chunk(self, stats: dict = None) -> str:
+        """Next chunk; refills the local batch with one multi-pop (status update rides along)"""
+        if not self.claimed:
+            self.claimed.extend(await self._claim_chunks(CHUNK_CLAIM, stats))
+        return self.claimed.popleft() if self.claimed else None
+
+    async def _claim_chunks(self, count: int, stats: dict = None) -> list:
         await self.ensure_connection()
         if not self.connected:
-            return None
+            return []
         try:
-            # LPOP returns element or None
-            return await self.client.lpop(REDIS_QUEUE_KEY)
+            async with self.client.pipeline(transaction=False) as pipe:
+                # LPOP with COUNT needs Redis 6.2+; older servers hand out one chunk per call
+                pipe.lpop(REDIS_QUEUE_KEY, count if self.multi_pop else None)
+                if stats is not None:
+                    self._queue_status(pipe, stats)
+                results = await pipe.execute()
+        except redis.ResponseError:
+            if not self.multi_pop:
+                return []
+            self.multi_pop = False
+            return await self._claim_chunks(count, stats)
         except Exception:
             self.connected = False
-            return None
+            return []
+        popped = results[0]
+        if not popped:
+            return []
+        if not self.multi_pop:
+            popped = [popped]
+        return [chunk.decode() for chunk in popped]
 
-    async def push_chunk(self, chunk: str):
-        """Push chunk back to queue (if failed)"""
+    async def push_chunk(self, *chunks: str):
+        """Push chunks back to queue (if failed) in one RPUSH"""
         await self.ensure_connection()
-        if not self.connected:
+        if not self.connected or not chunks:
             return
         try:
-            await self.client.rpush(REDIS_QUEUE_KEY, chunk)
+            await self.client.rpush(REDIS_QUEUE_KEY, *chunks)
         except Exception:
             self.connected = False
 
@@ -103,10 +146,10 @@ class RedisClient:
         if not self.connected:
             return
         try:
-            stats['last_update'] = time.time()
-            data = json.dumps(stats)
-            await self.client.hset(REDIS_NODE_STATUS_KEY, NODE_ID, data)
-            await self.client.expire(REDIS_NODE_STATUS_KEY, 300)
+            # HSET + EXPIRE in one round trip
+            async with self.client.pipeline(transaction=False) as pipe:
+                self._queue_status(pipe, stats)
+                await pipe.execute()
         except Exception:
             self.connected = False
 
@@ -118,37 +161,62 @@ class IDTraversalScraper:
         
         self.products_buffer = []
         self.total_requests = 0
+        self.total_errors = 0
         self.total_products = 0
         self.start_time = time.time()
         
         self.redis = RedisClient()
         self.current_chunk = None
-        self.chunk_progress = 0
+        self.chunk_start = 0
+        self.chunk_done = bytearray()  # One byte per ID of the current chunk, set once fetched
+        self.info_url = URL(ID_INFO_URL)  # Parsed once; fetch_id only adds ?id=
+        self.write_lock = threading.Lock()  # Executor saves vs. the final save
+        self.out = None  # Output CSV, kept open between saves
         
         # Ensure directories exist
         self.output_file.parent.mkdir(parents=True, exist_ok=True)
 
     def save_buffer(self):
         """Flush buffer to disk"""
-        if not self.products_buffer:
+        rows, self.products_buffer = self.products_buffer, []
+        count = self._write_rows(rows)
+        if rows and not count:
+            self.products_buffer[:0] = rows  # Keep for the next attempt
+        return count
+
+    async def save_buffer_async(self):
+        """Flush buffer to disk from a worker thread so in-flight requests keep running"""
+        rows, self.products_buffer = self.products_buffer, []
+        count = await asyncio.get_running_loop().run_in_executor(None, self._write_rows, rows)
+        if rows and not count:
+            self.products_buffer[:0] = rows  # Keep for the next attempt
+        return count
+
+    def _write_rows(self, rows: list) -> int:
+        if not rows:
             return 0
 
         try:
-            write_header = not self.output_file.exists() or self.output_file.stat().st_size == 0
-            
-            with open(self.output_file, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=CSV_HEADERS, quoting=csv.QUOTE_ALL)
-                if write_header:
-                    writer.writeheader()
-                writer.writerows(self.products_buffer)
+            with self.write_lock:
+                # Opened once per session: later saves are a single write + flush
+                if self.out is None:
+                    self.out = open(self.output_file, 'a', newline='', encoding='utf-8')
+                    if self.out.tell() == 0:
+                        self.out.write(CSV_HEADER_LINE)
+                self.out.write(''.join(map(format_csv_row, rows)))
+                self.out.flush()
             
-            count = len(self.products_buffer)
-            self.products_buffer = []
-            return count
+            return len(rows)
         except Exception as e:
             logger.error(f"Error saving buffer: {e}")
             return 0
 
+    def close_output(self):
+        with self.write_lock:
+            if self.out is not None:
+                self.out.close()
+                self.out = None
+
     def format_time(self, seconds: float) -> str:
         hours = int(seconds // 3600)
         minutes = int((seconds % 3600) // 60)
@@ -163,6 +231,7 @@ class IDTraversalScraper:
             "rate": self.total_products / elapsed if elapsed > 0 else 0,
             "current_chunk": self.current_chunk,
             "requests": self.total_requests,
+            "errors": self.total_errors,
             "elapsed": elapsed
         }
 
@@ -174,68 +243,81 @@ class IDTraversalScraper:
             return True # Discard invalid chunk
 
         total_ids = end_id - start_id
+        self.chunk_start = start_id
+        self.chunk_done = bytearray(total_ids)
         logger.info(f"📥 Processing chunk {chunk} ({total_ids} IDs)...")
         
-        # Create tasks for all IDs in chunk
-        # Process in batches to control concurrency within the chunk
-        
-        chunk_tasks = []
-        for product_id in range(start_id, end_id):
-            chunk_tasks.append(self.fetch_id(session, product_id))
-            
-            # If buffer gets too big, await some tasks
-            if len(chunk_tasks) >= MAX_CONCURRENCY:
-                await self._gather_tasks(chunk_tasks)
-                chunk_tasks = []
-
-        # Remaining tasks
-        if chunk_tasks:
-            await self._gather_tasks(chunk_tasks)
-            
+        # MAX_CONCURRENCY workers pull IDs from a small bounded queue: a new request
+        # starts as soon as any finishes, and memory stays flat for any chunk size
+        queue = asyncio.Queue(maxsize=MAX_CONCURRENCY * 2)
+        workers = [asyncio.create_task(self._fetch_worker(session, queue)) for _ in range(MAX_CONCURRENCY)]
+        try:
+            ids = range(start_id, end_id)
+            if SHUFFLE_CHUNK_IDS:
+                # Spread requests across the range in case the backend shards by ID
+                ids = random.sample(ids, total_ids)
+            for product_id in ids:
+                await queue.put(product_id)
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
         return True
 
-    async def _gather_tasks(self, tasks):
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        # Update redis status regularly
-        await self.redis.update_node_status(self.get_stats())
-        
-        # Periodic save
-        if len(self.products_buffer) >= SAVE_INTERVAL:
-            saved = self.save_buffer()
-            if saved:
-                logger.info(f"💾 Saved {saved} items")
+    async def _fetch_worker(self, session: aiohttp.ClientSession, queue: asyncio.Queue):
+        while True:
+            product_id = await queue.get()
+            try:
+                await self.fetch_id(session, product_id)
+            except Exception as e:
+                logger.error(f"Unexpected error fetching ID {product_id}: {e!r}")
+            finally:
+                queue.task_done()
+            self.chunk_done[product_id - self.chunk_start] = 1  # Skipped if cancelled mid-request
+
+    def unfinished_part(self, chunk: str) -> str:
+        """Range of the current chunk from its first unfetched ID on (None if it completed)"""
+        first = self.chunk_done.find(0)
+        if first == -1:
+            return None
+        return f"{self.chunk_start + first}:{chunk.split(':')[1]}"
+
+    async def _periodic_flush(self):
+        """Background task: push node status and save the buffer every STATUS_INTERVAL"""
+        while True:
+            await asyncio.sleep(STATUS_INTERVAL)
+            await self.redis.update_node_status(self.get_stats())
+            
+            if len(self.products_buffer) >= SAVE_INTERVAL:
+                saved = await self.save_buffer_async()
+                if saved:
+                    logger.info(f"💾 Saved {saved} items")
 
     async def fetch_id(self, session: aiohttp.ClientSession, product_id: int):
         self.total_requests += 1
-        url = f"{ID_INFO_URL}?id={product_id}"
-        
         try:
-            async with session.get(url, timeout=REQUEST_TIMEOUT) as response:
-                if response.status == 200:
-                    try:
-                        data = await response.json()
-                        # Check API code
-                        if data.get('code') == 200 and 'data' in data:
-                            product_data = data['data']
-                            # Enforce ID match (API might return related products or mismatch)
-                            # Actually info API returns a single object in 'data' usually, 
-                            # but let's double check structure. 
-                            # Based on curl output: {"code":200,"data":{"attr":[],...}}
-                            
-                            # Inject ID because it might be missing in data body 
-                            # (wait, earlier curl response didn't show ID in data body explicitly? 
-                            #  Ah, curl output: `{"code":200,"data":{"attr":[],"category":"...","name":...}`)
-                            # We need to inject the ID we requested.
-                            product_data['id'] = product_id
-                            
-                            transformed = transform_product(product_data)
-                            self.products_buffer.append(transformed)
-                            self.total_products += 1
-                            return True
-                    except Exception:
-                        pass
-        except Exception:
-            pass
+            async with session.get(self.info_url, params={"id": product_id}) as response:
+                # Misses (404s, error pages) are the common case; check instead of raising
+                if response.status != 200 or response.content_type != 'application/json':
+                    return False
+                data = json_loads(await response.read())  # No charset sniffing, native parser
+        except (asyncio.TimeoutError, aiohttp.ClientError, ValueError):
+            self.total_errors += 1
+            return False
+
+        # Check API code
+        if data.get('code') == 200 and 'data' in data:
+            product_data = data['data']
+            # Info API returns a single object in 'data' without the ID
+            # (curl output: `{"code":200,"data":{"attr":[],"category":"...","name":...}`),
+            # so inject the ID we requested.
+            product_data['id'] = product_id
+            
+            transformed = transform_product(product_data)
+            self.products_buffer.append(transformed)
+            self.total_products += 1
+            return True
         return False
 
     async def run(self, manual_range: tuple = None):
@@ -255,11 +337,23 @@ class IDTraversalScraper:
                 print("❌ Cannot start without Redis connection (unless using --range)!")
                 return
             use_redis = True
+            # stop.sh and watchdog.sh stop the node with SIGTERM: cancel the run like
+            # Ctrl+C so the unfinished and claimed chunks are pushed back to the queue
+            try:
+                asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+            except NotImplementedError:
+                pass  # No signal handlers on Windows event loops
         
         # Disable SSL verification for slightly faster connection/less issues if needed (or keep default)
-        connector = aiohttp.TCPConnector(limit=MAX_CONCURRENCY, limit_per_host=MAX_CONCURRENCY, ssl=False)
+        # One long-lived pool: idle keep-alive sockets and the DNS answer are reused across chunks
+        connector = aiohttp.TCPConnector(
+            limit=MAX_CONCURRENCY, limit_per_host=MAX_CONCURRENCY, ssl=False,
+            keepalive_timeout=60, ttl_dns_cache=300, enable_cleanup_closed=True
+        )
+        timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
         
-        async with aiohttp.ClientSession(connector=connector) as session:
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            flusher = asyncio.create_task(self._periodic_flush())
             # Manual Range Mode
             if manual_range:
                 start, end = manual_range
@@ -281,35 +375,62 @@ class IDTraversalScraper:
                 
             # Redis Distributed Mode
             else:
-                while True:
-                    chunk = await self.redis.pop_chunk()
-                    
-                    if not chunk:
-                        print("💤 Queue empty. Waiting 10s...")
-                        await asyncio.sleep(10)
-                        chunk = await self.redis.pop_chunk()
+                chunk = None  # Popped and not finished yet
+                next_chunk = asyncio.create_task(self.redis.pop_chunk(self.get_stats()))
+                try:
+                    while True:
+                        # Shielded so a cancel here can't drop a chunk whose LPOP already ran on the server
+                        chunk = await asyncio.shield(next_chunk)
+                        next_chunk = None
+                        
                         if not chunk:
-                            print("🎉 No more chunks! Scraper finished.")
-                            break
-                    
-                    self.current_chunk = chunk
-                    start_time = time.time()
-                    
-                    try:
-                        success = await self.process_chunk(session, chunk)
+                            print("💤 Queue empty. Waiting 10s...")
+                            await asyncio.sleep(10)
+                            next_chunk = asyncio.create_task(self.redis.pop_chunk())
+                            chunk = await asyncio.shield(next_chunk)
+                            next_chunk = None
+                            if not chunk:
+                                print("🎉 No more chunks! Scraper finished.")
+                                break
                         
-                        elapsed = time.time() - start_time
-                        rate = CHUNK_SIZE / elapsed
-                        print(f"✅ Chunk {chunk} done in {elapsed:.1f}s ({rate:.1f} IDs/s)")
+                        # Claim the next chunk while this one runs to hide the LPOP round trip
+                        next_chunk = asyncio.create_task(self.redis.pop_chunk(self.get_stats()))
+                        self.current_chunk = chunk
+                        start_time = time.time()
                         
-                    except KeyboardInterrupt:
-                        print(f"\n⚠️ Interrupted! Returning chunk {chunk} to queue...")
-                        await self.redis.push_chunk(chunk)
-                        raise
-                    except Exception as e:
-                        logger.error(f"Error processing chunk {chunk}: {e}")
+                        try:
+                            success = await self.process_chunk(session, chunk)
+                            
+                            elapsed = time.time() - start_time
+                            rate = CHUNK_SIZE / elapsed
+                            print(f"✅ Chunk {chunk} done in {elapsed:.1f}s ({rate:.1f} IDs/s)")
+                        except Exception as e:
+                            logger.error(f"Error processing chunk {chunk}: {e}")
+                        chunk = None
+                
+                except (KeyboardInterrupt, asyncio.CancelledError):
+                    # Only the unfetched tail goes back, so finished IDs aren't scraped twice;
+                    # the prefetched and locally claimed chunks are returned with it
+                    returned = [self.unfinished_part(chunk) if chunk else None, *self.redis.claimed]
+                    self.redis.claimed.clear()
+                    if next_chunk is not None:
+                        try:
+                            # A failed or cancelled prefetch must not keep the rest from going back
+                            returned.append(await next_chunk)
+                            returned.extend(self.redis.claimed)
+                            self.redis.claimed.clear()
+                        except (Exception, asyncio.CancelledError):
+                            pass
+                    returned = [c for c in returned if c]
+                    if returned:
+                        print(f"\n⚠️ Interrupted! Returning {', '.join(returned)} to queue...")
+                        await self.redis.push_chunk(*returned)
+                    raise
+
+            flusher.cancel()
 
         self.save_buffer()
+        self.close_output()
         print("\n🏁 Session ended.")
 
 def main():
@@ -326,12 +447,16 @@ def main():
             print("❌ Invalid range format. Use START:END (e.g. 1000000:2000000)")
             return
 
+    if UVLOOP_AVAILABLE:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    
     scraper = IDTraversalScraper()
     try:
         asyncio.run(scraper.run(manual_range))
-    except KeyboardInterrupt:
-        print("\n🛑 Stopped by user")
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        print("\n🛑 Stopped")
         scraper.save_buffer()
+        scraper.close_output()
 
 if __name__ == "__main__":
     main()
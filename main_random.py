@@ -1,15 +1,36 @@
 import asyncio
-import csv
-import json
 import logging
 import sys
+import queue
+import threading
 import time
 import argparse
 from pathlib import Path
-from typing import Set, Optional
+from typing import Optional
 from collections import deque
+from itertools import chain, islice
 
 import aiohttp
+from yarl import URL
+
+# libuv event loop (optional, not available on Windows)
+try:
+    import uvloop
+    UVLOOP_AVAILABLE = True
+except ImportError:
+    UVLOOP_AVAILABLE = False
+
+# Compressed exact ID set (optional): ~2 bytes per product ID instead of ~70 in a set
+try:
+    from pyroaring import BitMap as IDSet
+except ImportError:
+    IDSet = set
+
+# Faster JSON (optional); redis-py accepts the dumped bytes as-is
+try:
+    from orjson import dumps as json_dumps, loads as json_loads
+except ImportError:
+    from json import dumps as json_dumps, loads as json_loads
 
 # Redis support (optional)
 try:
@@ -20,8 +41,8 @@ except ImportError:
 
 from config import (
     BASE_URL, LIMIT_PER_PAGE, MAX_CONCURRENCY, BATCH_SIZE,
-    REQUEST_TIMEOUT, MAX_DUPLICATE_RATIO, DUPLICATE_CHECK_WINDOW,
-    TARGET_UNIQUE, OUTPUT_FILE, SEEN_IDS_FILE, CSV_HEADERS, SAVE_INTERVAL,
+    REQUEST_TIMEOUT, STATUS_INTERVAL, MAX_DUPLICATE_RATIO, DUPLICATE_CHECK_WINDOW,
+    TARGET_UNIQUE, OUTPUT_FILE, SEEN_IDS_FILE, CSV_HEADER_LINE, format_csv_row, SAVE_INTERVAL, SAVE_MAX_AGE,
     NODE_ID, REDIS_HOST, REDIS_PORT, REDIS_PASSWORD, REDIS_DB,
     REDIS_SEEN_IDS_KEY, REDIS_NODE_STATUS_KEY
 )
@@ -38,6 +59,44 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Built once instead of on every fetch_one call
+API_URL = URL(BASE_URL)
+REQUEST_HEADERS = {
+    "Content-Type": "application/json",
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) Chrome/120.0.0.0 Safari/537.36",
+}
+REQUEST_PAYLOAD = json_dumps({"page": 1, "limit": LIMIT_PER_PAGE})  # Same body every time; encode once
+
+
+class SeenIDs:
+    """Exact set of int product IDs: IDSet for 0 <= id < 2**32, a plain set for the rest"""
+    
+    def __init__(self, ids=()):
+        self.small = IDSet()  # A roaring bitmap only holds unsigned 32-bit values
+        self.other = set()
+        self.update(ids)
+    
+    def __contains__(self, pid: int) -> bool:
+        return pid in (self.small if 0 <= pid <= 0xFFFFFFFF else self.other)
+    
+    def __len__(self) -> int:
+        return len(self.small) + len(self.other)
+    
+    def __iter__(self):
+        return chain(self.small, self.other)
+    
+    def update(self, ids):
+        for pid in ids:
+            (self.small if 0 <= pid <= 0xFFFFFFFF else self.other).add(pid)
+
+
+def product_id(product: dict) -> Optional[int]:
+    """Product ID as an int (None if missing or not an integer)"""
+    try:
+        return int(product.get('id'))
+    except (TypeError, ValueError):
+        return None
+
 
 class RedisDedup:
     """Redis-based central deduplication (Async)"""
@@ -67,36 +126,22 @@ class RedisDedup:
             self.connected = False
             return False
     
-    async def is_seen(self, product_id: str) -> bool:
+    async def add_seen_many(self, product_ids: list) -> Optional[list]:
+        """SADD every ID in one pipeline; True for each ID no node had seen yet (None if offline)"""
         if not self.connected:
             await self._try_reconnect()
-        if not self.connected:
-            return False
-        try:
-            return await self.client.sismember(REDIS_SEEN_IDS_KEY, product_id)
-        except Exception:
-            await self._try_reconnect()
-            return False
-    
-    async def add_seen(self, product_id: str) -> bool:
-        if not self.connected:
-            await self._try_reconnect()
-        if not self.connected:
-            return False
-        try:
-            return await self.client.sadd(REDIS_SEEN_IDS_KEY, product_id) == 1
-        except Exception:
-            await self._try_reconnect()
-            return False
-    
-    async def add_seen_batch(self, product_ids: list) -> int:
         if not self.connected or not product_ids:
-            return 0
+            return None
         try:
-            return await self.client.sadd(REDIS_SEEN_IDS_KEY, *product_ids)
-        except Exception:
-            await self._try_reconnect()
-            return 0
+            async with self.client.pipeline(transaction=False) as pipe:
+                for product_id in product_ids:
+                    pipe.sadd(REDIS_SEEN_IDS_KEY, product_id)
+                return [added == 1 for added in await pipe.execute()]
+        except Exception as e:
+            # Reconnect on the next call; this page falls back to the local set
+            logger.warning(f"⚠️ Redis dedup failed: {e}")
+            self.connected = False
+            return None
     
     async def get_count(self) -> int:
         if not self.connected:
@@ -114,8 +159,11 @@ class RedisDedup:
             return
         try:
             stats['last_update'] = time.time()
-            await self.client.hset(REDIS_NODE_STATUS_KEY, NODE_ID, json.dumps(stats))
-            await self.client.expire(REDIS_NODE_STATUS_KEY, 300)
+            # HSET + EXPIRE in one round trip
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.hset(REDIS_NODE_STATUS_KEY, NODE_ID, json_dumps(stats))
+                pipe.expire(REDIS_NODE_STATUS_KEY, 300)
+                await pipe.execute()
         except Exception:
             await self._try_reconnect()
     
@@ -135,7 +183,7 @@ class DistributedScraper:
         self.output_file = Path(OUTPUT_FILE)
         self.seen_ids_file = Path(SEEN_IDS_FILE)
         
-        self.local_seen_ids: Set[str] = set()
+        self.local_seen_ids = SeenIDs()  # Int IDs, see product_id
         self.products_buffer = []
         self.total_requests = 0
         self.total_products = 0
@@ -149,6 +197,7 @@ class DistributedScraper:
         
         # Duplicate tracking (sliding window)
         self.recent_results = deque(maxlen=DUPLICATE_CHECK_WINDOW)
+        self.dup_count = 0  # Running sum of recent_results
         
         # Adaptive rate limiting
         self.current_batch_size = BATCH_SIZE
@@ -160,6 +209,18 @@ class DistributedScraper:
         self.throttle_threshold = 5.0
         self.error_threshold = 0.3
         
+        # Disk writes run on a dedicated thread fed through this queue
+        self.write_queue = queue.Queue()
+        self.csv_fh = None
+        self.ids_fh = None
+        self.writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer.start()
+        
+        # Worker pool (sized by current_batch_size)
+        self.running = False
+        self.active_workers = 0
+        self.workers = set()
+        
         # Ensure directories exist
         self.output_file.parent.mkdir(parents=True, exist_ok=True)
 
@@ -168,7 +229,7 @@ class DistributedScraper:
         if self.seen_ids_file.exists():
             try:
                 with open(self.seen_ids_file, 'r') as f:
-                    self.local_seen_ids = set(line.strip() for line in f if line.strip())
+                    self.local_seen_ids = SeenIDs(int(line) for line in f if line[:1].isdigit())
                 self.unique_products = len(self.local_seen_ids)
                 logger.info(f"📂 Loaded {len(self.local_seen_ids):,} local IDs")
             except Exception as e:
@@ -192,71 +253,121 @@ class DistributedScraper:
         total = len(self.local_seen_ids)
         logger.info(f"📤 Fast-syncing {total:,} local IDs to Redis (Pipeline mode)...")
         
-        # Use large batches with Pipeline for maximum speed
+        # SADDs of 10k IDs are queued on one non-transactional pipeline, which is
+        # sent once ~1 MB of IDs is pending (a round trip per ~100k IDs, no MULTI/EXEC)
         ids_list = list(self.local_seen_ids)
-        batch_size = 50000  # 50k per pipeline batch
+        sadd_size = 10_000
+        pipeline_bytes = 1 << 20
         synced = 0
+        queued = 0
         
-        for i in range(0, len(ids_list), batch_size):
-            batch = ids_list[i:i+batch_size]
-            # Pipeline: send all commands at once, execute in one round trip
-            pipe = self.redis.client.pipeline()
-            pipe.sadd(REDIS_SEEN_IDS_KEY, *batch)
-            results = await pipe.execute()
-            synced += results[0] if results else 0
-            
-            # Progress update
-            progress = min(i + batch_size, total)
-            logger.info(f"   📤 Progress: {progress:,}/{total:,} ({progress*100//total}%)")
+        async with self.redis.client.pipeline(transaction=False) as pipe:
+            for i in range(0, total, sadd_size):
+                batch = ids_list[i:i+sadd_size]
+                pipe.sadd(REDIS_SEEN_IDS_KEY, *batch)
+                queued += len(batch) * (len(str(batch[-1])) + 6)  # RESP: $<len>\r\n<id>\r\n
+                
+                if queued >= pipeline_bytes or i + sadd_size >= total:
+                    synced += sum(await pipe.execute())
+                    queued = 0
+                    
+                    # Progress update
+                    progress = min(i + sadd_size, total)
+                    logger.info(f"   📤 Progress: {progress:,}/{total:,} ({progress*100//total}%)")
         
         redis_count = await self.redis.get_count()
         logger.info(f"✅ Synced to Redis! New: {synced:,}, Total in Redis: {redis_count:,}")
 
-    async def is_product_seen(self, product_id: str) -> bool:
-        """Check if product is seen (check local first, then Redis)"""
-        if product_id in self.local_seen_ids:
-            return True
-        if self.use_redis:
-            return await self.redis.is_seen(product_id)
-        return False
-
-    async def mark_product_seen(self, product_id: str):
-        """Mark product as seen (both Redis and local)"""
-        self.local_seen_ids.add(product_id)
+    async def claim_new_products(self, product_ids: list) -> set:
+        """Mark IDs as seen and return the ones that were new (local set first, then one Redis round trip)"""
+        candidates = [pid for pid in dict.fromkeys(product_ids) if pid is not None and pid not in self.local_seen_ids]
+        self.local_seen_ids.update(candidates)
         if self.use_redis:
-            await self.redis.add_seen(product_id)
+            # SADD reports whether the ID was new, so check + mark is a single command
+            added = await self.redis.add_seen_many(candidates)
+            if added is not None:
+                return {pid for pid, is_new in zip(candidates, added) if is_new}
+        return set(candidates)
 
     def save_buffer(self):
-        """Flush buffer to disk"""
-        if not self.products_buffer:
-            return
+        """Hand the buffer to the writer thread (never blocks the event loop on disk)"""
+        rows, self.products_buffer = self.products_buffer, []
+        if rows:
+            self.write_queue.put(rows)
+        return len(rows)
+
+    def close_writer(self):
+        """Wait for queued rows to reach disk and stop the writer thread"""
+        if self.writer.is_alive():
+            self.write_queue.put(None)
+            self.writer.join()
+
+    def _writer_loop(self):
+        # Each file keeps its own unsaved rows, so a retry never writes a row to a file twice.
+        # IDs follow the CSV: an ID only reaches the seen file once its row is on disk.
+        pending_rows = []
+        pending_ids = []
+        while True:
+            rows = self.write_queue.get()
+            if rows is None:
+                break
+            pending_rows.extend(rows)
+            if self._write_csv(pending_rows):
+                pending_ids.extend(pending_rows)
+                pending_rows = []
+            if self._write_ids(pending_ids):
+                pending_ids = []
+        if pending_rows or pending_ids:
+            logger.error(f"Dropping {len(pending_rows)} unsaved rows and {len(pending_ids)} unsaved IDs")
+        for fh in (self.csv_fh, self.ids_fh):
+            if fh is not None:
+                fh.close()
+
+    def _write_csv(self, rows: list) -> int:
+        if not rows:
+            return 0
 
         try:
-            write_header = not self.output_file.exists() or self.output_file.stat().st_size == 0
-            
-            with open(self.output_file, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=CSV_HEADERS, quoting=csv.QUOTE_ALL)
-                if write_header:
-                    writer.writeheader()
-                writer.writerows(self.products_buffer)
+            # Both files stay open on the writer thread; a save is one write + flush each
+            if self.csv_fh is None:
+                self.csv_fh = open(self.output_file, 'a', newline='', encoding='utf-8', buffering=1 << 20)
+                if self.csv_fh.tell() == 0:
+                    self.csv_fh.write(CSV_HEADER_LINE)
             
+            self.csv_fh.write(''.join(map(format_csv_row, rows)))
+            self.csv_fh.flush()
+            return len(rows)
+        except Exception as e:
+            logger.error(f"Error saving buffer: {e}")
+            return 0
+
+    def _write_ids(self, rows: list) -> int:
+        if not rows:
+            return 0
+
+        try:
             # Append new IDs to local file
-            with open(self.seen_ids_file, 'a') as f:
-                for p in self.products_buffer:
-                    f.write(f"{p['id']}\n")
+            if self.ids_fh is None:
+                self.ids_fh = open(self.seen_ids_file, 'ab', buffering=1 << 20)
             
-            saved_count = len(self.products_buffer)
-            self.products_buffer = []
-            return saved_count
+            self.ids_fh.write('\n'.join([str(p['id']) for p in rows]).encode() + b'\n')
+            self.ids_fh.flush()
+            return len(rows)
         except Exception as e:
-            logger.error(f"Error saving buffer: {e}")
+            logger.error(f"Error saving seen IDs: {e}")
             return 0
 
     def get_duplicate_ratio(self) -> float:
         if len(self.recent_results) < 100:
             return 0.0
-        duplicates = sum(self.recent_results)
-        return duplicates / len(self.recent_results)
+        return self.dup_count / len(self.recent_results)
+
+    def record_results(self, flags: list):
+        """Add 0/1 (new/duplicate) flags to the window, keeping dup_count in step in O(len(flags))"""
+        window = self.recent_results
+        evicted = max(0, len(window) + len(flags) - window.maxlen)
+        self.dup_count += sum(flags) - sum(islice(chain(window, flags), evicted))
+        window.extend(flags)
 
     def get_error_rate(self) -> float:
         total = self.success_count + self.error_count
@@ -276,7 +387,7 @@ class DistributedScraper:
         if avg_time > self.throttle_threshold or error_rate > self.error_threshold:
             new_size = max(self.min_batch_size, int(self.current_batch_size * 0.8))
             if new_size < self.current_batch_size:
-                logger.info(f"\n⚠️ API throttling detected (resp: {avg_time:.1f}s, err: {error_rate*100:.0f}%) - reducing batch to {new_size}")
+                logger.info(f"\n⚠️ API throttling detected (resp: {avg_time:.1f}s, err: {error_rate*100:.0f}%) - reducing workers to {new_size}")
                 self.current_batch_size = new_size
         elif avg_time < 2.0 and error_rate < 0.1:
             new_size = min(self.max_batch_size, int(self.current_batch_size * 1.1))
@@ -287,57 +398,64 @@ class DistributedScraper:
             self.success_count = 0
             self.error_count = 0
 
-    async def fetch_batch(self, session: aiohttp.ClientSession) -> int:
-        tasks = []
-        for _ in range(self.current_batch_size):
-            tasks.append(self.fetch_one(session))
-        
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        new_products = 0
-        for result in results:
-            if isinstance(result, int):
-                new_products += result
-        
-        self.adjust_rate()
-        return new_products
+    def scale_workers(self, session: aiohttp.ClientSession):
+        """Start workers until the pool matches current_batch_size (extra ones exit on their own)"""
+        while self.active_workers < self.current_batch_size:
+            self.active_workers += 1
+            task = asyncio.create_task(self._worker(session))
+            self.workers.add(task)
+            task.add_done_callback(self.workers.discard)
+
+    async def _status_heartbeat(self):
+        """Background task: push node status every STATUS_INTERVAL, off the reporting loop"""
+        while True:
+            await self.redis.update_node_status(self.get_stats())
+            await asyncio.sleep(STATUS_INTERVAL)
+
+    async def _worker(self, session: aiohttp.ClientSession):
+        """Fetch pages back to back; a new request starts as soon as the previous one ends"""
+        try:
+            while (self.running and self.unique_products < self.target
+                   and self.active_workers <= self.current_batch_size):
+                await self.fetch_one(session)
+        finally:
+            self.active_workers -= 1
 
     async def fetch_one(self, session: aiohttp.ClientSession) -> int:
         start_time = time.time()
         try:
-            headers = {
-                "Content-Type": "application/json",
-                "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) Chrome/120.0.0.0 Safari/537.36",
-            }
-            payload = {"page": 1, "limit": LIMIT_PER_PAGE}
-            
-            timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
-            async with session.post(BASE_URL, json=payload, headers=headers, timeout=timeout) as response:
+            async with session.post(API_URL, data=REQUEST_PAYLOAD, headers=REQUEST_HEADERS) as response:
                 elapsed = time.time() - start_time
                 self.response_times.append(elapsed)
                 
                 if response.status == 200:
-                    data = await response.json()
+                    data = json_loads(await response.read())
                     products = data.get('data', {}).get('data', [])
                     
                     self.total_requests += 1
                     self.total_products += len(products)
                     self.success_count += 1
                     
+                    pids = [product_id(p) for p in products]  # Normalized once: str IDs dedup with int ones
+                    new_ids = await self.claim_new_products(pids)
+                    
                     new_count = 0
-                    for p in products:
-                        pid = str(p.get('id'))
-                        is_seen = await self.is_product_seen(pid)
-                        if pid and not is_seen:
-                            await self.mark_product_seen(pid)
-                            transformed = transform_product(p)
-                            self.products_buffer.append(transformed)
-                            self.unique_products += 1
-                            new_count += 1
-                            self.recent_results.append(0)
+                    flags = []
+                    for p, pid in zip(products, pids):
+                        if pid in new_ids:
+                            new_ids.discard(pid)  # Repeats within the page count as duplicates
+                            flags.append(0)
+                            try:
+                                self.products_buffer.append(transform_product(p))
+                                new_count += 1
+                            except Exception as e:
+                                # The ID is already claimed: lose only this product, not the rest of the page
+                                logger.warning(f"Skipping product {pid}: {e}")
                         else:
-                            self.recent_results.append(1)
+                            flags.append(1)
                     
+                    self.unique_products += new_count
+                    self.record_results(flags)
                     return new_count
                 else:
                     self.error_count += 1
@@ -383,7 +501,7 @@ class DistributedScraper:
         print(f"🚀 Filovesk Scraper - {mode}")
         print(f"   Node ID: {NODE_ID}")
         print(f"   Target: {self.target:,} unique products")
-        print(f"   Concurrency: {BATCH_SIZE} requests/batch")
+        print(f"   Concurrency: {BATCH_SIZE} workers")
         print(f"   Auto-stop: when duplicate ratio > {MAX_DUPLICATE_RATIO*100:.0f}%")
         print("=" * 70)
         
@@ -393,22 +511,30 @@ class DistributedScraper:
             logger.info(f"✅ Target already reached: {self.unique_products:,} products")
             return
         
-        connector = aiohttp.TCPConnector(limit=MAX_CONCURRENCY, limit_per_host=MAX_CONCURRENCY)
+        # One long-lived pool: idle keep-alive sockets and the DNS answer are reused across batches
+        connector = aiohttp.TCPConnector(
+            limit=MAX_CONCURRENCY, limit_per_host=MAX_CONCURRENCY,
+            keepalive_timeout=60, ttl_dns_cache=300, enable_cleanup_closed=True
+        )
+        
+        timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
         
-        async with aiohttp.ClientSession(connector=connector) as session:
-            last_save_count = self.unique_products
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            last_save = time.time()
+            self.running = True
+            self.scale_workers(session)
+            heartbeat = asyncio.create_task(self._status_heartbeat()) if self.use_redis else None
             
+            # Workers fetch continuously; this loop only reports and resizes the pool
             while self.unique_products < self.target:
-                await self.fetch_batch(session)
+                await asyncio.sleep(1)
+                self.adjust_rate()
+                self.scale_workers(session)
                 
                 elapsed = time.time() - self.start_time
                 rate = self.unique_products / elapsed if elapsed > 0 else 0
                 dup_ratio = self.get_duplicate_ratio()
                 
-                # Update Redis node status
-                if self.use_redis:
-                    await self.redis.update_node_status(self.get_stats())
-                
                 # Progress display
                 redis_indicator = "🌐" if self.use_redis else "💻"
                 sys.stdout.write(
@@ -421,10 +547,12 @@ class DistributedScraper:
                 )
                 sys.stdout.flush()
                 
-                # Periodic save
-                if self.unique_products - last_save_count >= SAVE_INTERVAL:
+                # Save when the buffer is full, or when it has waited SAVE_MAX_AGE
+                # (bounds what a crash can lose while duplicates slow the fill rate)
+                now = time.time()
+                if len(self.products_buffer) >= SAVE_INTERVAL or (self.products_buffer and now - last_save >= SAVE_MAX_AGE):
                     saved = self.save_buffer()
-                    last_save_count = self.unique_products
+                    last_save = now
                     if saved:
                         logger.info(f"\n💾 Saved {saved} products (total: {self.unique_products:,})")
                 
@@ -432,12 +560,16 @@ class DistributedScraper:
                 if dup_ratio >= MAX_DUPLICATE_RATIO and len(self.recent_results) >= DUPLICATE_CHECK_WINDOW:
                     print(f"\n\n⚠️ Auto-stopping: Duplicate ratio {dup_ratio*100:.1f}% exceeds threshold")
                     break
-                
-                await asyncio.sleep(0.1)
+            
+            # Let in-flight requests finish so claimed IDs still reach the buffer
+            self.running = False
+            await asyncio.gather(*self.workers, return_exceptions=True)
+            if heartbeat:
+                heartbeat.cancel()
         
         # Final save
-        if self.products_buffer:
-            self.save_buffer()
+        self.save_buffer()
+        self.close_writer()
         
         # Summary
         elapsed = time.time() - self.start_time
@@ -471,15 +603,21 @@ def main():
             output_file.unlink()
         logger.info("🧹 Cleared local data")
     
+    if UVLOOP_AVAILABLE:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    
     scraper = DistributedScraper(target=args.target)
     
     try:
         asyncio.run(scraper.run())
     except KeyboardInterrupt:
         print("\n\n🛑 Stopped by user")
-        if scraper.products_buffer:
-            scraper.save_buffer()
-            print(f"💾 Saved {len(scraper.products_buffer)} products before exit")
+    finally:
+        # The writer is a daemon thread; drain it on every exit path, not just a clean run
+        saved = scraper.save_buffer()
+        scraper.close_writer()
+        if saved:
+            print(f"💾 Saved {saved} products before exit")
 
 
 if __name__ == "__main__":
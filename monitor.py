@@ -3,41 +3,59 @@ Scraper Monitor
 Real-time dashboard for Crawlee Scraper
 """
 
+import os
+import re
 import time
 import sys
-import subprocess
 from pathlib import Path
 
 LOG_FILE = Path("scraper.log")
 CSV_FILE = Path("data/products.csv")
 
+# Bytes already counted and the newlines in them; only appended bytes are read again
+_csv_scanned = {"size": 0, "lines": 0}
+
+# Format: Page: 401 | Products: 480 | Rate: 3.9/s | Proxies: 18/32 | Errors: 176
+STATS_LINE = re.compile(r'Page:.*Rate:')
+
 def clear_screen():
     sys.stdout.write("\033[H\033[J")
 
 def get_csv_count():
     try:
-        if not CSV_FILE.exists():
-            return 0
-        # Fast line count
-        result = subprocess.run(['wc', '-l', str(CSV_FILE)], capture_output=True, text=True)
-        return int(result.stdout.split()[0]) - 1  # Subtract header
-    except:
+        size = CSV_FILE.stat().st_size
+    except OSError:
+        return 0
+    try:
+        if size < _csv_scanned["size"]:
+            _csv_scanned.update(size=0, lines=0)  # Truncated or replaced: count from scratch
+        with open(CSV_FILE, 'rb') as f:
+            f.seek(_csv_scanned["size"])
+            while True:
+                chunk = f.read(1 << 20)
+                if not chunk:
+                    break
+                _csv_scanned["size"] += len(chunk)
+                _csv_scanned["lines"] += chunk.count(b'\n')
+        return _csv_scanned["lines"] - 1  # Subtract header
+    except OSError:
         return 0
 
 def get_latest_log_stats():
     try:
         if not LOG_FILE.exists():
             return "No log file found"
-        # Read last few lines to find the stats line
-        # Format: Page: 401 | Products: 480 | Rate: 3.9/s | Proxies: 18/32 | Errors: 176
-        result = subprocess.run(['tail', '-n', '20', str(LOG_FILE)], capture_output=True, text=True)
-        lines = result.stdout.strip().split('\n')
+        # Read the tail of the log to find the stats line
+        with open(LOG_FILE, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(f.tell() - 4096, 0))
+            lines = f.read().decode('utf-8', errors='replace').split('\n')
         
         for line in reversed(lines):
-            if "Page:" in line and "Rate:" in line:
+            if STATS_LINE.search(line):
                 return line.strip()
         return "Waiting for stats..."
-    except:
+    except OSError:
         return "Error reading logs"
 
 def main():
@@ -7,7 +7,6 @@ Connects to Redis and displays real-time stats from all nodes
 """
 
 import time
-import json
 import sys
 import os
 
@@ -17,6 +16,12 @@ except ImportError:
     print("Redis not installed. Run: pip install redis")
     sys.exit(1)
 
+# Faster status parsing (optional)
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
 # Configuration from environment or defaults
 REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.environ.get("REDIS_PORT", "6379"))
@@ -55,13 +60,16 @@ def main():
         print(f"❌ Connection failed: {e}")
         sys.exit(1)
     
+    parsed = {}  # node_id -> (raw status, parsed stats); only changed payloads are re-parsed
+    
     try:
         while True:
-            # Get total unique IDs from Redis (accurate count)
-            total_ids = client.scard(REDIS_SEEN_IDS_KEY)
-            
-            # Get all node statuses
-            nodes = client.hgetall(REDIS_NODE_STATUS_KEY)
+            # Total unique IDs (accurate count) and all node statuses in one round trip
+            pipe = client.pipeline(transaction=False)
+            pipe.scard(REDIS_SEEN_IDS_KEY)
+            pipe.hgetall(REDIS_NODE_STATUS_KEY)
+            total_ids, nodes = pipe.execute()
+            parsed = {node_id: parsed[node_id] for node_id in nodes if node_id in parsed}
             
             # Clear screen
             os.system('clear' if os.name != 'nt' else 'cls')
@@ -78,7 +86,10 @@ def main():
             
             for node_id, status_json in sorted(nodes.items()):
                 try:
-                    stats = json.loads(status_json)
+                    cached = parsed.get(node_id)
+                    if cached is None or cached[0] != status_json:
+                        cached = parsed[node_id] = (status_json, json_loads(status_json))
+                    stats = cached[1]
                     last_update = stats.get('last_update', 0)
                     age = time.time() - last_update
                     
@@ -105,8 +116,8 @@ def main():
                     pass
             
             # Clean up very stale nodes
-            for node_id in stale_to_delete:
-                client.hdel(REDIS_NODE_STATUS_KEY, node_id)
+            if stale_to_delete:
+                client.hdel(REDIS_NODE_STATUS_KEY, *stale_to_delete)
             
             if active_nodes == 0:
                 print(f"{'No active nodes':^85}")
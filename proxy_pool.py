@@ -4,17 +4,33 @@ Manages SOCKS5 proxies from xray processes
 Handles fetching, parsing, starting, and rotating proxies
 """
 
-import asyncio
-import base64
 import hashlib
-import json
+import http.client
 import logging
 import random
+import re
 import subprocess
 import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Optional
-from urllib.parse import unquote
+from urllib.parse import unquote, urlsplit
+
+# SIMD base64 (optional); same API as the stdlib module
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
+
+# Faster JSON (optional); both variants return compact UTF-8 bytes
+try:
+    from orjson import dumps as json_dumps
+except ImportError:
+    import json
+
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode()
 
 from config import PROXY_SUBSCRIPTION_URL, PROXY_PORTS
 
@@ -26,6 +42,9 @@ SUBSCRIPTION_CACHE = DATA_DIR / "subscription_cache.txt"
 
 logger = logging.getLogger(__name__)
 
+# Node URIs in a subscription, matched on the decoded bytes so only the URIs are decoded
+VLESS_URI = re.compile(rb'vless://\S+')
+
 def _normalize_urls() -> List[str]:
     urls = PROXY_SUBSCRIPTION_URL
     if isinstance(urls, (list, tuple, set)):
@@ -40,29 +59,43 @@ def _cache_key(urls: List[str]) -> str:
     return hashlib.md5(joined.encode()).hexdigest()
 
 
+def _download(url: str) -> Optional[str]:
+    """GET one subscription source (None on failure)"""
+    # Some providers pick the response format by User-Agent; keep the one curl sent
+    request = urllib.request.Request(url, headers={"User-Agent": "curl/8.4.0"})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.read().decode('utf-8', errors='replace').strip()
+    except (OSError, ValueError, http.client.HTTPException):  # IncompleteRead, BadStatusLine, ...
+        return None
+
+
 def fetch_subscription() -> List[str]:
-    """Fetch subscription content using curl and return decoded URIs"""
+    """Fetch all subscription sources concurrently and return decoded URIs"""
     try:
         urls = _normalize_urls()
         if not urls:
             raise Exception("No subscription URLs configured")
 
         cache_key = _cache_key(urls)
-        if SUBSCRIPTION_CACHE.exists() and SUBSCRIPTION_CACHE.stat().st_size > 0:
-            cached = SUBSCRIPTION_CACHE.read_text().splitlines()
-            if cached and cached[0] == f"# key:{cache_key}":
-                logger.info("📋 Using cached subscription")
-                return [line.strip() for line in cached[1:] if line.strip()]
+        try:
+            with open(SUBSCRIPTION_CACHE) as f:
+                # Only the key line is read unless the cache matches
+                if f.readline().rstrip() == f"# key:{cache_key}":
+                    logger.info("📋 Using cached subscription")
+                    return [line.strip() for line in f if line.strip()]
+        except OSError:
+            pass
 
         logger.info("📥 Fetching subscription content...")
+        with ThreadPoolExecutor(max_workers=min(8, len(urls))) as executor:
+            contents = list(executor.map(_download, urls))
+        
         all_uris: List[str] = []
-        for idx, url in enumerate(urls, 1):
-            cmd = ['curl', '-s', '-L', url]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-            if result.returncode != 0:
+        for idx, content in enumerate(contents, 1):
+            if content is None:
                 logger.warning("⚠️ Failed to fetch subscription source %d", idx)
                 continue
-            content = result.stdout.strip()
             if not content:
                 logger.warning("⚠️ Empty content from subscription source %d", idx)
                 continue
@@ -83,45 +116,42 @@ def fetch_subscription() -> List[str]:
 
 def decode_subscription(content: str) -> List[str]:
     """Decode base64 subscription to list of node URIs"""
-    import re
-    try:
-        decoded = base64.b64decode(content).decode('utf-8')
-    except:
-        decoded = content
-    
-    vless_pattern = r'vless://[^\s\r\n]+'
-    uris = re.findall(vless_pattern, decoded)
-    return uris
+    # Base64 text never contains "://", so a plain URI list is matched as-is
+    if 'vless://' in content:
+        raw = content.encode()
+    else:
+        try:
+            raw = base64.b64decode(content)
+        except ValueError:
+            return []
+    return [uri.decode('utf-8', errors='replace') for uri in VLESS_URI.findall(raw)]
 
 def parse_vless_uri(uri: str) -> Optional[dict]:
     """Parse VLESS URI to config dict"""
     if not uri.startswith('vless://'):
         return None
     try:
-        uri = uri[8:]
-        if '#' in uri:
-            uri, name = uri.rsplit('#', 1)
-            name = unquote(name)
-        else:
-            name = "Unknown"
-        
-        uuid, rest = uri.split('@', 1)
-        if '?' in rest:
-            host_port, params_str = rest.split('?', 1)
-        else:
-            host_port = rest
-            params_str = ""
-        
-        host, port = host_port.rsplit(':', 1)
+        # The name is everything after the first '#', and a port outside
+        # 0-65535 makes the URI invalid (urlsplit raises ValueError)
+        parts = urlsplit(uri)
+        if parts.path:
+            return None  # vless://uuid@host:443/?... has never been accepted
+        # Host exactly as written (case, IPv6 brackets); urlsplit's hostname would normalize it
+        uuid, _, host = parts.netloc.partition('@')
+        host, port = host.rpartition(':')[0], parts.port
+        if not uuid or not host or port is None:
+            return None
         
+        # Plain unquote, not parse_qsl: '+' is literal in base64 values such as pbk
         params = {}
-        for param in params_str.split('&'):
+        for param in parts.query.split('&'):
             if '=' in param:
                 k, v = param.split('=', 1)
                 params[k] = unquote(v)
         
         return {
-            'name': name, 'uuid': uuid, 'host': host, 'port': int(port),
+            'name': unquote(parts.fragment) if parts.fragment else "Unknown",
+            'uuid': uuid, 'host': host, 'port': port,
             'security': params.get('security', 'none'),
             'type': params.get('type', 'tcp'),
             'flow': params.get('flow', ''),
@@ -130,7 +160,7 @@ def parse_vless_uri(uri: str) -> Optional[dict]:
             'sid': params.get('sid', ''),
             'fp': params.get('fp', 'chrome'),
         }
-    except Exception as e:
+    except ValueError:
         return None
 
 def generate_xray_config(node: dict, local_port: int) -> dict:
@@ -174,16 +204,16 @@ class ProxyPool:
         self.current_index = 0
         self.request_counts = {port: 0 for port in self.ports}
         self.failed_ports = set()
-        self._lock = None
+        self.available = list(self.ports)  # Ports not in failed_ports; rebuilt only when that changes
         
         CONFIG_DIR.mkdir(parents=True, exist_ok=True)
 
     def start(self):
         """Start Xray processes"""
-        self._lock = asyncio.Lock()
         logger.info("🚀 Starting proxy pool...")
-        uris = fetch_subscription()
-        parsed_nodes = [parse_vless_uri(u) for u in uris if parse_vless_uri(u)]
+        # Sources often list the same node; keep the first copy so each port gets a distinct node
+        uris = dict.fromkeys(fetch_subscription())
+        parsed_nodes = [node for u in uris if (node := parse_vless_uri(u))]
         
         if not parsed_nodes:
             logger.error("❌ No valid nodes found!")
@@ -193,28 +223,29 @@ class ProxyPool:
         self.nodes = parsed_nodes[:len(self.ports)]
         logger.info(f"Loaded {len(self.nodes)} nodes for {len(self.ports)} ports")
         
-        for i, node in enumerate(self.nodes):
-            if i >= len(self.ports): break
-            port = self.ports[i]
-            
-            config = generate_xray_config(node, port)
-            config_file = CONFIG_DIR / f"xray_{port}.json"
-            with open(config_file, 'w') as f:
-                json.dump(config, f, indent=2)
-                
-            try:
-                proc = subprocess.Popen(
-                    [XRAY_PATH, 'run', '-c', str(config_file)],
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL
-                )
-                self.processes.append(proc)
-            except Exception as e:
-                logger.error(f"Failed to start proxy on port {port}: {e}")
+        # Write configs and spawn xray concurrently; one shared warmup follows
+        with ThreadPoolExecutor(max_workers=min(32, len(self.nodes))) as executor:
+            self.processes = [p for p in executor.map(self._spawn_one, self.ports, self.nodes) if p]
         
         logger.info(f"✅ Started {len(self.processes)} proxy processes")
         time.sleep(2) # Warmup
 
+    def _spawn_one(self, port: int, node: dict) -> Optional[subprocess.Popen]:
+        """Write the xray config for one node and start its process"""
+        config_file = CONFIG_DIR / f"xray_{port}.json"
+        try:
+            # Any failure must come back as None: an exception would escape executor.map
+            # and leave the processes other threads already started untracked
+            config_file.write_bytes(json_dumps(generate_xray_config(node, port)))
+            return subprocess.Popen(
+                [XRAY_PATH, 'run', '-c', str(config_file)],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+        except Exception as e:
+            logger.error(f"Failed to start proxy on port {port}: {e}")
+            return None
+
     def stop(self):
         """Stop all processes"""
         logger.info("🛑 Stopping proxy pool...")
@@ -228,28 +259,34 @@ class ProxyPool:
 
     async def get_proxy(self) -> str:
         """Get next proxy URL in round-robin fashion"""
-        async with self._lock:
-            available = [p for p in self.ports if p not in self.failed_ports]
-            if not available:
-                self.failed_ports.clear()
-                available = self.ports
-            
-            port = available[self.current_index % len(available)]
-            self.current_index += 1
-            self.request_counts[port] += 1
-            
-            return f"socks5://127.0.0.1:{port}"
+        # Nothing here awaits, so selection is already atomic on the event loop
+        if not self.available:
+            self.failed_ports.clear()
+            self.available = list(self.ports)
+        
+        port = self.available[self.current_index % len(self.available)]
+        self.current_index += 1
+        self.request_counts[port] += 1
+        
+        return f"socks5://127.0.0.1:{port}"
+    
+    def _refresh_available(self):
+        self.available = [p for p in self.ports if p not in self.failed_ports]
     
     def mark_failed(self, proxy_url: str):
         try:
             port = int(proxy_url.split(":")[-1])
-            self.failed_ports.add(port)
+            if port not in self.failed_ports:
+                self.failed_ports.add(port)
+                self._refresh_available()
         except: pass
     
     def mark_success(self, proxy_url: str):
         try:
             port = int(proxy_url.split(":")[-1])
-            self.failed_ports.discard(port)
+            if port in self.failed_ports:
+                self.failed_ports.discard(port)
+                self._refresh_available()
         except: pass
     
     def stats(self) -> dict:
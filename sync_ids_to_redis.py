@@ -4,12 +4,16 @@ Sync Product IDs to Redis
 将 products_filtered.csv 中的产品 ID 同步到 Redis seen_ids 集合
 用于分布式爬虫去重，避免重复爬取已有数据
 """
-import csv
+import os
 import sys
 import redis
 import argparse
+import pyarrow.compute as pc
+from pyroaring import BitMap
 from tqdm import tqdm
 
+from csv_ids import iter_id_batches as iter_csv_ids, split_numeric
+
 # Import config from crawlee_scraper
 sys.path.insert(0, '/Users/a1234/Downloads/project-Whick/shop/crawlee_scraper')
 from config import (
@@ -19,15 +23,25 @@ from config import (
 
 # Data file path
 DEFAULT_CSV_FILE = '/Users/a1234/Downloads/project-Whick/data/products_filtered.csv'
-BATCH_SIZE = 10000  # Redis SADD batch size
+BATCH_SIZE = 50000  # Redis SADD batch size
+PIPELINE_DEPTH = 8  # SADDs sent per round trip
+
 
+def iter_id_batches(f):
+    """逐块读取 CSV 的 id 列，返回去除空白后的非空 ID (Arrow 字符串数组)"""
+    for ids in iter_csv_ids(f):
+        ids = pc.utf8_trim_whitespace(ids)
+        yield ids.filter(pc.not_equal(ids, ""))
 
-def count_lines(filepath):
-    """快速统计文件行数"""
-    print(f"📊 Counting lines in {filepath}...")
-    with open(filepath, 'r', encoding='utf-8') as f:
-        count = sum(1 for _ in f) - 1  # Minus header
-    return count
+
+def take_new_ids(ids, seen: BitMap) -> list:
+    """返回批次中此前未出现过的 ID，并记入 seen（CSV 内的重复不再发送到 Redis）"""
+    numbers, others = split_numeric(ids)
+    block = BitMap(numbers)
+    block -= seen
+    seen |= block
+    others = pc.unique(others).to_pylist()
+    return [str(i) for i in block] + others
 
 
 def sync_ids_to_redis(csv_file: str, clear: bool = False, dry_run: bool = False):
@@ -78,57 +92,43 @@ def sync_ids_to_redis(csv_file: str, clear: bool = False, dry_run: bool = False)
         else:
             print("Skipped clearing.")
     
-    # Count total lines
-    total_lines = count_lines(csv_file)
-    print(f"📦 Total products to sync: {total_lines:,}")
-    
     if dry_run:
         print(f"\n🏃 DRY RUN - No data will be written")
-        return
     
-    # Read CSV and sync IDs
+    # Read CSV and sync IDs (progress is tracked in bytes; no separate line-count pass)
     print(f"\n📥 Reading CSV and syncing to Redis...")
-    batch = []
+    total = 0
     synced = 0
-    duplicates = 0
+    seen = BitMap()
+    pipe = r.pipeline(transaction=False)
     
-    with open(csv_file, 'r', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        header = next(reader)  # Skip header
-        
-        # Find id column index
+    with open(csv_file, 'rb') as f:
+        progress = tqdm(total=os.path.getsize(csv_file), desc="Syncing", unit="B", unit_scale=True)
         try:
-            id_index = header.index('id')
-        except ValueError:
-            print(f"❌ 'id' column not found in CSV. Headers: {header}")
+            for ids in iter_id_batches(f):
+                total += len(ids)
+                if not dry_run:
+                    ids = take_new_ids(ids, seen)
+                    # Queue SADD batches; each execute() keeps PIPELINE_DEPTH of them in one round trip
+                    for i in range(0, len(ids), BATCH_SIZE):
+                        pipe.sadd(REDIS_SEEN_IDS_KEY, *ids[i:i + BATCH_SIZE])
+                        if len(pipe) >= PIPELINE_DEPTH:
+                            synced += sum(pipe.execute())
+                progress.update(f.tell() - progress.n)
+            if len(pipe):
+                synced += sum(pipe.execute())
+        except KeyError:
+            print(f"❌ 'id' column not found in CSV: {csv_file}")
             return
-        
-        progress = tqdm(total=total_lines, desc="Syncing", unit="ids")
-        
-        for row in reader:
-            if len(row) > id_index:
-                product_id = row[id_index].strip()
-                if product_id:
-                    batch.append(product_id)
-                    
-                    if len(batch) >= BATCH_SIZE:
-                        # SADD batch to Redis
-                        added = r.sadd(REDIS_SEEN_IDS_KEY, *batch)
-                        synced += added
-                        duplicates += len(batch) - added
-                        batch = []
-                        progress.update(BATCH_SIZE)
-        
-        # Process remaining batch
-        if batch:
-            added = r.sadd(REDIS_SEEN_IDS_KEY, *batch)
-            synced += added
-            duplicates += len(batch) - added
-            progress.update(len(batch))
-        
-        progress.close()
+        finally:
+            progress.close()
+    
+    print(f"📦 Total products: {total:,}")
+    if dry_run:
+        return
     
     # Final stats
+    duplicates = total - synced
     final_count = r.scard(REDIS_SEEN_IDS_KEY)
     print(f"\n{'='*60}")
     print(f"✅ Sync Complete!")
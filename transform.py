@@ -6,14 +6,20 @@ Converts API response to CSV format
 import hashlib
 import json
 import re
+import time
 from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+
+
+# Characters dropped from slugs, and the separator runs that collapse to a single '-'
+SLUG_DROP = re.compile(r'[^\w\s-]+')
+SLUG_SEPARATORS = re.compile(r'[\s_-]+')
 
 
 def generate_slug(name: str, product_id: str) -> str:
     """Generate URL-friendly slug from product name"""
-    slug = re.sub(r'[^\w\s-]', '', name.lower())
-    slug = re.sub(r'[\s_]+', '-', slug)
-    slug = re.sub(r'-+', '-', slug).strip('-')
+    slug = SLUG_SEPARATORS.sub('-', SLUG_DROP.sub('', name.lower())).strip('-')
     return f"{slug}-{product_id}"[:100]
 
 
@@ -27,48 +33,80 @@ def parse_category(category_str: str, tag: str) -> tuple:
     """Parse category - API returns numeric IDs, use generic categories"""
     # API returns category as "2/163" (numeric IDs) - no real category names
     # Use "Fashion" / "Products" as generic values since real names unavailable
+    if not category_str or category_str.replace('/', '').isdigit():
+        return "Fashion", "Products", ""  # Common case: only numeric IDs, nothing to split
+    
     level1 = "Fashion"
     level2 = "Products" 
     level3 = ""
     
-    # If category has non-numeric parts, use them
-    if category_str:
-        parts = category_str.split('/')
-        for part in parts:
-            if part and not part.isdigit():
-                if not level1 or level1 == "Fashion":
-                    level1 = part.title()
-                elif not level2 or level2 == "Products":
-                    level2 = part.title()
-                else:
-                    level3 = part.title()
-                    break
+    # Category has non-numeric parts, use them
+    for part in category_str.split('/'):
+        if part and not part.isdigit():
+            if not level1 or level1 == "Fashion":
+                level1 = part.title()
+            elif not level2 or level2 == "Products":
+                level2 = part.title()
+            else:
+                level3 = part.title()
+                break
     
     return level1, level2, level3
 
 
+# Strings json.dumps writes verbatim: printable ASCII other than '"' and '\'
+JSON_PLAIN = re.compile(r'[ !#-\[\]-~]*')
+
+
 def format_image_urls(main_image: str, pictures: list) -> str:
     """Format image URLs as JSON array string"""
     all_images = []
     
     if isinstance(pictures, list) and pictures:
-        all_images.extend([img for img in pictures if img])
+        all_images = pictures if all(pictures) else [img for img in pictures if img]
     
     if not all_images and main_image:
-        all_images.append(main_image)
+        all_images = [main_image]
     
-    return json.dumps(all_images) if all_images else "[]"
+    if not all_images:
+        return "[]"
+    
+    # Plain URLs need no escaping, so build the same text json.dumps would
+    if all(type(img) is str for img in all_images) and JSON_PLAIN.fullmatch(''.join(all_images)):
+        return '["' + '", "'.join(all_images) + '"]'
+    return json.dumps(all_images)
 
 
-def format_datetime(dt_str: str = None) -> str:
-    """Format datetime string to DD/MM/YYYY HH:MM:SS"""
-    if not dt_str:
-        return datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+DATETIME_FORMAT = "%d/%m/%Y %H:%M:%S"
+
+# Fallback timestamp, formatted at most once per wall-clock second
+_now_cache = {"second": None, "text": ""}
+
+
+def _now_text() -> str:
+    second = int(time.time())
+    if second != _now_cache["second"]:
+        _now_cache.update(second=second, text=datetime.fromtimestamp(second).strftime(DATETIME_FORMAT))
+    return _now_cache["text"]
+
+
+@lru_cache(maxsize=4096)
+def _format_iso(dt_str: str) -> Optional[str]:
+    """DATETIME_FORMAT text for an ISO timestamp, None if it does not parse"""
+    # Memoized: created_at and updated_at are often the same string
     try:
         dt = datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
-        return dt.strftime("%d/%m/%Y %H:%M:%S")
-    except:
-        return datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+    except ValueError:
+        return None
+    # %-formatting the fields is ~2x faster than strftime and gives the same text
+    return "%02d/%02d/%d %02d:%02d:%02d" % (dt.day, dt.month, dt.year, dt.hour, dt.minute, dt.second)
+
+
+def format_datetime(dt_str: str = None) -> str:
+    """Format datetime string to DD/MM/YYYY HH:MM:SS"""
+    if not dt_str or not isinstance(dt_str, str):
+        return _now_text()
+    return _format_iso(dt_str) or _now_text()
 
 
 def transform_product(product: dict) -> dict: